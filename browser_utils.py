@@ -6,19 +6,13 @@ import time
 
 from pathlib import Path
 
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.chrome.options import Options
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import (
-    TimeoutException,
-    StaleElementReferenceException,
-    ElementClickInterceptedException,
-    NoSuchElementException,
-)
-from webdriver_manager.chrome import ChromeDriverManager
+from browser_watchdog import BROWSER_MARKER_SWITCH, DEFAULT_WATCHDOG
+
+# selenium's Chrome bindings and webdriver_manager are imported in setup_driver:
+# importing this module must stay cheap for runs that never start a browser.
+
+# Where Chrome saves files it downloads itself
+BROWSER_DOWNLOAD_DIR = os.path.join(os.getcwd(), "downloads")
 
 BLOCKED_URL_PATTERNS = [
     "*://*/*.jpg",
@@ -97,6 +91,11 @@ def ensure_brave_shields_aggressive(preferences_path: Path) -> None:
 
 
 def setup_driver(browser: str = "brave"):
+    from selenium.webdriver import Chrome
+    from selenium.webdriver.chrome.service import Service
+    from selenium.webdriver.chrome.options import Options
+    from webdriver_manager.chrome import ChromeDriverManager
+
     # Configure Chrome options
     chrome_options = Options()
     chrome_options.add_argument("--start-maximized")  # Start with maximized window
@@ -106,9 +105,10 @@ def setup_driver(browser: str = "brave"):
     chrome_options.add_argument("--disable-notifications")
     chrome_options.add_argument("--disable-extensions")
     chrome_options.add_argument("--blink-settings=imagesEnabled=false")
+    chrome_options.add_argument(BROWSER_MARKER_SWITCH)  # Lets the watchdog find our orphans
     # Auto-download without prompts, to default downloads dir
     prefs = {
-        "download.default_directory": os.path.join(os.getcwd(), "downloads"),
+        "download.default_directory": BROWSER_DOWNLOAD_DIR,
         "download.prompt_for_download": False,
         "download.directory_upgrade": True,
         "safebrowsing.enabled": True,
@@ -144,8 +144,9 @@ def setup_driver(browser: str = "brave"):
         pass  # Use default Chrome
 
     # Initialize the WebDriver
-    driver = webdriver.Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
+    driver = Chrome(service=Service(ChromeDriverManager().install()), options=chrome_options)
     apply_driver_hardening(driver)
+    DEFAULT_WATCHDOG.register(driver, label=browser_normalized)
     return driver
 
 
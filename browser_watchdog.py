@@ -0,0 +1,318 @@
+# browser_watchdog.py
+import csv
+import os
+import threading
+import time
+from pathlib import Path
+
+try:
+    import psutil
+except ImportError:  # optional: without it the watchdog only handles windows and quitting
+    psutil = None
+
+# Extra switch added to every browser we launch so leftovers from crashed runs can be told apart
+# from the user's own Chrome/Brave windows. Chrome ignores switches it does not know.
+BROWSER_MARKER_SWITCH = "--series-batch-downloader"
+
+DEFAULT_MAX_RSS_MB = 1500.0
+DEFAULT_MAX_AGE_SECONDS = 30 * 60.0
+DEFAULT_SAMPLES_PATH = Path(os.getcwd()) / "browser_memory.csv"
+
+CHROMEDRIVER_NAMES = ("chromedriver", "chromedriver.exe")
+BROWSER_NAMES = ("chrome", "chrome.exe", "brave", "brave.exe", "chromium", "chromium-browser")
+
+# How often held browsers (left open to finish a browser-side transfer) are swept.
+MONITOR_INTERVAL_SECONDS = 30.0
+# Chrome needs a moment after the click before its .crdownload file shows up.
+HOLD_GRACE_SECONDS = 30.0
+# Held browsers are exempt from the age budget while they transfer; this only catches stalled downloads.
+DEFAULT_MAX_HOLD_SECONDS = 6 * 60 * 60.0
+
+SAMPLE_FIELDS = ["timestamp", "instance", "driver_pid", "rss_mb", "processes", "age_seconds", "windows"]
+
+
+class BrowserBudgetExceeded(RuntimeError):
+    pass
+
+
+def driver_pid(driver):
+    try:
+        return driver.service.process.pid
+    except AttributeError:
+        return None
+
+
+def driver_process_tree(driver) -> list:
+    """chromedriver plus every browser/renderer process below it."""
+    pid = driver_pid(driver)
+    if psutil is None or pid is None:
+        return []
+    try:
+        root = psutil.Process(pid)
+        return [root] + root.children(recursive=True)
+    except psutil.Error:
+        return []
+
+
+def tree_rss_mb(processes) -> float:
+    total = 0
+    for proc in processes:
+        try:
+            total += proc.memory_info().rss
+        except psutil.Error:
+            continue
+    return total / (1024 * 1024)
+
+
+def kill_processes(processes) -> int:
+    killed = 0
+    for proc in processes:
+        try:
+            proc.kill()
+            killed += 1
+        except psutil.Error:
+            continue
+    if killed:
+        psutil.wait_procs(processes, timeout=5)
+    return killed
+
+
+def trim_windows(driver) -> int:
+    """Close every tab except the current one; each carries its own injected scripts and heap."""
+    closed = 0
+    try:
+        current = driver.current_window_handle
+        for handle in driver.window_handles:
+            if handle == current:
+                continue
+            driver.switch_to.window(handle)
+            driver.close()
+            closed += 1
+        if closed:
+            driver.switch_to.window(current)
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"Unable to close extra browser windows: {exc}")
+    return closed
+
+
+def _has_marker(proc) -> bool:
+    try:
+        return BROWSER_MARKER_SWITCH in (proc.cmdline() or [])
+    except psutil.Error:
+        return False
+
+
+def _is_orphan(proc) -> bool:
+    try:
+        parent = proc.parent()
+        if parent is None or parent.pid == 1:
+            return True
+        # The parent pid was reused by a newer process: the real parent is gone.
+        return parent.create_time() > proc.create_time()
+    except psutil.Error:
+        return False
+
+
+class BrowserWatchdog:
+    """Tracks memory and age of every driver this process starts and retires the ones over budget."""
+
+    def __init__(self, max_rss_mb: float = DEFAULT_MAX_RSS_MB, max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS, samples_path=DEFAULT_SAMPLES_PATH, max_hold_seconds: float = DEFAULT_MAX_HOLD_SECONDS):
+        self.max_rss_mb = max_rss_mb
+        self.max_age_seconds = max_age_seconds
+        self.max_hold_seconds = max_hold_seconds
+        self.samples_path = Path(samples_path) if samples_path else None
+        self._instances = {}
+        self._counter = 0
+        self._warned = False
+        self._lock = threading.RLock()
+        self._monitor = None
+        self._transfers_finished = None
+
+    def register(self, driver, label: str = "browser"):
+        with self._lock:
+            self._counter += 1
+            self._instances[id(driver)] = {
+                "instance": f"{label}-{self._counter}",
+                "started": time.monotonic(),
+                "pid": driver_pid(driver),
+                "driver": driver,
+                "held_since": None,
+            }
+        return driver
+
+    def hold(self, driver, transfers_finished=None) -> None:
+        """Keep a finished run's browser open while it transfers, under the monitor's budget.
+
+        `transfers_finished` is polled by the monitor; once it returns True (after a
+        short grace period) every held browser is retired. Until then only the memory
+        cap and `max_hold_seconds`, counted from the hold, apply; the age budget does not.
+        """
+        if driver is None:
+            return
+        with self._lock:
+            info = self._instances.get(id(driver))
+            if info is None:
+                self.register(driver)
+                info = self._instances[id(driver)]
+            info["held_since"] = time.monotonic()
+            if transfers_finished is not None:
+                self._transfers_finished = transfers_finished
+        self.start_monitor()
+
+    def sweep(self, transfers_finished=None) -> int:
+        """Sample every held browser and retire the ones over budget or no longer needed."""
+        with self._lock:
+            held = [info for info in self._instances.values() if info["held_since"] is not None]
+        if not held:
+            return 0
+        finished = False
+        if transfers_finished is not None:
+            try:
+                finished = transfers_finished()
+            except Exception as exc:  # pylint: disable=broad-except
+                print(f"Unable to check browser transfers: {exc}")
+        retired = 0
+        for info in held:
+            driver = info["driver"]
+            sample = self.sample(driver)
+            held_for = time.monotonic() - info["held_since"]
+            reason = self._over_memory(sample)
+            if not reason and finished and held_for > HOLD_GRACE_SECONDS:
+                reason = f"{sample['instance']} has no transfer left"
+            if not reason and held_for > self.max_hold_seconds:
+                reason = f"{sample['instance']} held for {held_for:.0f}s (limit {self.max_hold_seconds:.0f}s)"
+            if reason:
+                print(f"Retiring held browser: {reason}")
+                self.retire(driver)
+                retired += 1
+        return retired
+
+    def start_monitor(self, interval: float = MONITOR_INTERVAL_SECONDS) -> None:
+        with self._lock:
+            if self._monitor is not None and self._monitor.is_alive():
+                return
+
+            def _run():
+                while True:
+                    time.sleep(interval)
+                    try:
+                        self.sweep(self._transfers_finished)
+                    except Exception as exc:  # pylint: disable=broad-except
+                        print(f"Browser watchdog sweep failed: {exc}")
+                    with self._lock:
+                        if not any(info["held_since"] is not None for info in self._instances.values()):
+                            self._monitor = None
+                            return
+
+            self._monitor = threading.Thread(target=_run, name="browser-watchdog", daemon=True)
+            self._monitor.start()
+
+    def sample(self, driver) -> dict:
+        with self._lock:
+            info = self._instances.get(id(driver))
+            if info is None:
+                info = self._instances[id(self.register(driver))]
+        processes = driver_process_tree(driver)
+        try:
+            windows = len(driver.window_handles)
+        except Exception:  # pylint: disable=broad-except
+            windows = 0
+        sample = {
+            "timestamp": f"{time.time():.0f}",
+            "instance": info["instance"],
+            "driver_pid": info["pid"],
+            "rss_mb": f"{tree_rss_mb(processes):.1f}" if processes else "",
+            "processes": len(processes),
+            "age_seconds": f"{time.monotonic() - info['started']:.0f}",
+            "windows": windows,
+        }
+        self._export(sample)
+        return sample
+
+    def _export(self, sample: dict) -> None:
+        if not self.samples_path:
+            return
+        try:
+            is_new = not self.samples_path.exists()
+            with self.samples_path.open("a", newline="", encoding="utf-8") as fp:
+                writer = csv.DictWriter(fp, fieldnames=SAMPLE_FIELDS)
+                if is_new:
+                    writer.writeheader()
+                writer.writerow(sample)
+        except OSError as exc:
+            print(f"Unable to write browser memory samples: {exc}")
+
+    def check(self, driver) -> None:
+        """Close stray tabs, record a sample and raise BrowserBudgetExceeded when over budget."""
+        if driver is None:
+            return
+        if psutil is None and not self._warned:
+            print("psutil is not installed; browser memory is not being tracked.")
+            self._warned = True
+        trim_windows(driver)
+        reason = self._over_budget(self.sample(driver))
+        if reason:
+            raise BrowserBudgetExceeded(reason)
+
+    def _over_memory(self, sample: dict):
+        if sample["rss_mb"] and float(sample["rss_mb"]) > self.max_rss_mb:
+            return f"{sample['instance']} uses {sample['rss_mb']} MB (limit {self.max_rss_mb:.0f} MB)"
+        return None
+
+    def _over_budget(self, sample: dict):
+        reason = self._over_memory(sample)
+        if reason:
+            return reason
+        if float(sample["age_seconds"]) > self.max_age_seconds:
+            return f"{sample['instance']} is {sample['age_seconds']}s old (limit {self.max_age_seconds:.0f}s)"
+        return None
+
+    def retire(self, driver) -> None:
+        """Quit a driver and kill whatever part of its process tree survived (or quit() threw)."""
+        if driver is None:
+            return
+        processes = driver_process_tree(driver)
+        with self._lock:
+            self._instances.pop(id(driver), None)
+        try:
+            driver.quit()
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"driver.quit() failed: {exc}")
+        survivors = [proc for proc in processes if proc.is_running()] if processes else []
+        if survivors:
+            print(f"Killing {len(survivors)} leftover browser process(es).")
+            kill_processes(survivors)
+
+    def reap_orphans(self) -> int:
+        """Kill chromedriver/browser processes left behind by earlier crashed runs."""
+        if psutil is None:
+            return 0
+        with self._lock:
+            live = {info["pid"] for info in self._instances.values()}
+        doomed = []
+        for proc in psutil.process_iter(["name", "cmdline"]):
+            try:
+                name = (proc.info["name"] or "").lower()
+                cmdline = proc.info["cmdline"] or []
+                if proc.pid in live or proc.pid == os.getpid():
+                    continue
+                if name in CHROMEDRIVER_NAMES and _is_orphan(proc):
+                    # Only chromedrivers that launched one of our browsers: a standalone
+                    # chromedriver or Grid node legitimately runs under PID 1 in containers.
+                    children = proc.children(recursive=True)
+                    if any(_has_marker(child) for child in children):
+                        doomed.append(proc)
+                        doomed.extend(children)
+                elif name in BROWSER_NAMES and BROWSER_MARKER_SWITCH in cmdline and _is_orphan(proc):
+                    doomed.append(proc)
+                    doomed.extend(proc.children(recursive=True))
+            except psutil.Error:
+                continue
+        unique = list({proc.pid: proc for proc in doomed}.values())
+        killed = kill_processes(unique) if unique else 0
+        if killed:
+            print(f"Reaped {killed} orphaned browser process(es) from earlier runs.")
+        return killed
+
+
+DEFAULT_WATCHDOG = BrowserWatchdog()
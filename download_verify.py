@@ -0,0 +1,264 @@
+# download_verify.py
+import hashlib
+import mmap
+import os
+import re
+from pathlib import Path
+from urllib.parse import urlparse, unquote
+
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_REPAIR_ROUNDS = 3
+
+# A finished file whose last MiB is all zeros was preallocated but never filled in.
+ZERO_TRAILER_PROBE = 1024 * 1024
+
+MKV_EBML_MAGIC = b"\x1a\x45\xdf\xa3"
+MKV_SEGMENT_ID = b"\x18\x53\x80\x67"
+
+
+class DownloadError(RuntimeError):
+    pass
+
+
+def filename_from_response(response, fallback: str) -> str:
+    disposition = response.headers.get("Content-Disposition") or ""
+    match = re.search(r"filename\*?=(?:UTF-8'')?\"?([^\";]+)\"?", disposition, re.IGNORECASE)
+    name = unquote(match.group(1)) if match else unquote(os.path.basename(urlparse(response.url).path))
+    name = re.sub(r'[\\/:*?"<>|]', "_", name).strip()
+    return name or fallback
+
+
+def expected_length(response, offset: int = 0):
+    """Total file size announced by a 200 or 206 response, or None when unknown."""
+    content_range = response.headers.get("Content-Range") or ""
+    match = re.match(r"bytes \d+-\d+/(\d+)", content_range)
+    if match:
+        return int(match.group(1))
+    length = response.headers.get("Content-Length")
+    return offset + int(length) if length and length.isdigit() else None
+
+
+def _read_vint(buf, offset: int):
+    """Decode an EBML variable-size integer; returns (value, length, is_unknown_size)."""
+    first = buf[offset]
+    length = 1
+    mask = 0x80
+    while length <= 8 and not first & mask:
+        length += 1
+        mask >>= 1
+    if length > 8:
+        raise ValueError("Invalid EBML vint")
+    value = first & (mask - 1)
+    all_ones = value == mask - 1
+    for index in range(1, length):
+        byte = buf[offset + index]
+        value = (value << 8) | byte
+        all_ones = all_ones and byte == 0xFF
+    return value, length, all_ones
+
+
+def probe_mp4(buf, size: int):
+    """Walk top-level boxes; returns (problem, damaged_from) where damaged_from marks missing bytes.
+
+    Box types are not checked against a list (fragmented files carry prft, emsg,
+    ssix and others); only the size arithmetic and a moov/moof box are required.
+    """
+    offset = 0
+    seen = set()
+    while offset + 8 <= size:
+        box_size = int.from_bytes(buf[offset:offset + 4], "big")
+        box_type = bytes(buf[offset + 4:offset + 8])
+        header = 8
+        if box_size == 1:
+            if offset + 16 > size:
+                return "truncated box header", offset
+            box_size = int.from_bytes(buf[offset + 8:offset + 16], "big")
+            header = 16
+        elif box_size == 0:
+            box_size = size - offset
+        if box_size < header:
+            return f"corrupt box '{box_type.decode(errors='replace')}' at {offset}", offset
+        seen.add(box_type)
+        if offset + box_size > size:
+            return f"box '{box_type.decode(errors='replace')}' runs past end of file", size
+        offset += box_size
+    if offset != size:
+        return "trailing partial box header", offset
+    if b"moov" not in seen and b"moof" not in seen:
+        return "no moov box", None
+    return None, None
+
+
+def probe_mkv(buf, size: int):
+    segment_at = buf.find(MKV_SEGMENT_ID, 0, min(size, 4096))
+    if segment_at < 0:
+        return "no Segment element", None
+    segment_size, length, unknown = _read_vint(buf, segment_at + 4)
+    if unknown:
+        return None, None
+    segment_end = segment_at + 4 + length + segment_size
+    if segment_end > size:
+        return "Segment runs past end of file", size
+    return None, None
+
+
+def probe_container(path) -> tuple:
+    """Check header and trailer of a media file through a memory map.
+
+    Returns (problem, damaged_from): `problem` is None for a plausible file and
+    `damaged_from` is the first offset that needs re-fetching when it is known.
+    """
+    path = Path(path)
+    size = path.stat().st_size
+    if size == 0:
+        return "empty file", 0
+    with path.open("rb") as fp, mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+        trailer_start = max(0, size - ZERO_TRAILER_PROBE)
+        if not buf[trailer_start:size].strip(b"\x00"):
+            # Walk back block by block, then to the byte just after the last written one,
+            # so exactly the unfilled tail is re-fetched.
+            block_end = trailer_start
+            while block_end > 0:
+                block_start = max(0, block_end - ZERO_TRAILER_PROBE)
+                written = len(buf[block_start:block_end].rstrip(b"\x00"))
+                if written:
+                    return "zero-filled trailer", block_start + written
+                block_end = block_start
+            return "zero-filled trailer", 0
+        if buf[:4] == MKV_EBML_MAGIC:
+            return probe_mkv(buf, size)
+        if size >= 8 and bytes(buf[4:8]) in (b"ftyp", b"styp"):
+            return probe_mp4(buf, size)
+    return None, None
+
+
+def damaged_ranges(path, total_size=None):
+    """Byte ranges [start, end) of `path` that must be re-fetched; [] when the file looks complete."""
+    return _inspect(path, total_size)[1]
+
+
+def _inspect(path, total_size=None):
+    path = Path(path)
+    size = path.stat().st_size if path.exists() else 0
+    problem, damaged_from = probe_container(path) if size else ("empty file", 0)
+    ranges = []
+    if problem:
+        print(f"Integrity check for {path.name}: {problem}")
+        end = total_size if total_size is not None else None
+        if damaged_from is None:
+            # Structurally broken with no way to tell where: fetch everything again.
+            damaged_from = 0
+        if end is None or damaged_from < end:
+            ranges.append((damaged_from, end))
+    elif total_size is not None and size < total_size:
+        ranges.append((size, total_size))
+    return problem, ranges
+
+
+def trim_to_size(path, total_size) -> bool:
+    """Cut a file that grew past the announced size back to it; returns True when it did."""
+    path = Path(path)
+    if total_size is None or not path.exists() or path.stat().st_size <= total_size:
+        return False
+    print(f"Truncating {path.name} from {path.stat().st_size} to {total_size} bytes")
+    os.truncate(path, total_size)
+    return True
+
+
+def fetch_range(session, url: str, path, start: int, end=None, digest=None) -> int:
+    """Write bytes [start, end) of `url` into `path` in place; returns the bytes written."""
+    headers = {"Range": f"bytes={start}-{'' if end is None else end - 1}"}
+    written = 0
+    with session.get(url, headers=headers, stream=True, timeout=60) as response:
+        if start and response.status_code != 206:
+            raise DownloadError(f"Server ignored range request ({response.status_code}) for {url}")
+        response.raise_for_status()
+        mode = "r+b" if Path(path).exists() else "wb"
+        with open(path, mode) as fp:
+            fp.seek(start)
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                if not chunk:
+                    continue
+                fp.write(chunk)
+                if digest is not None:
+                    digest.update(chunk)
+                written += len(chunk)
+            if end is None:
+                fp.truncate()
+    return written
+
+
+def download_and_verify(session, url: str, directory, fallback_name: str = "episode", stem: str = None):
+    """Stream `url` into `directory`, hashing on the fly, then verify and repair damaged ranges.
+
+    With `stem` the file is named `stem` plus the extension the server announced, so
+    hosts that call every episode `video.mp4` do not overwrite earlier ones.
+    Returns a dict with the final path, size and SHA-256 (None when the hash could
+    not be kept streaming because a non-tail range had to be repaired).
+    """
+    directory = Path(directory)
+    with session.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        if "text/html" in (response.headers.get("Content-Type") or ""):
+            raise DownloadError(f"Link did not resolve to a file: {url}")
+        total_size = expected_length(response)
+        name = filename_from_response(response, fallback_name)
+        if stem:
+            name = stem + os.path.splitext(name)[1]
+        final_path = directory / name
+        part_path = directory / (name + ".part")
+        digest = hashlib.sha256()
+        with part_path.open("wb") as fp:
+            try:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if chunk:
+                        fp.write(chunk)
+                        digest.update(chunk)
+            except Exception as exc:  # pylint: disable=broad-except
+                print(f"Transfer interrupted for {name}: {exc}")
+
+    previous = None
+    for round_number in range(1, MAX_REPAIR_ROUNDS + 1):
+        if trim_to_size(part_path, total_size):
+            # The running hash covered the extra bytes.
+            digest = None
+        problem, ranges = _inspect(part_path, total_size)
+        if not ranges:
+            break
+        if problem and (problem, ranges) == previous:
+            # The server sent the same bytes back; fetching them again cannot help.
+            raise DownloadError(f"{name} still has {problem} after re-fetching bytes {ranges[0][0]} onwards")
+        previous = (problem, ranges)
+        size = part_path.stat().st_size
+        for start, end in ranges:
+            print(f"Re-fetching bytes {start}-{'' if end is None else end - 1} of {name} (round {round_number})...")
+            # Appending after the streamed bytes keeps the running hash valid; anything else voids it.
+            continue_hash = digest is not None and start == size
+            if not continue_hash:
+                digest = None
+            try:
+                fetch_range(session, url, part_path, start, end, digest if continue_hash else None)
+            except Exception as exc:  # pylint: disable=broad-except
+                print(f"Range re-fetch failed: {exc}")
+    else:
+        trim_to_size(part_path, total_size)
+        ranges = damaged_ranges(part_path, total_size)
+        if ranges:
+            raise DownloadError(f"{name} is still incomplete after {MAX_REPAIR_ROUNDS} repair rounds: {ranges}")
+
+    os.replace(part_path, final_path)
+    result = {
+        "path": final_path,
+        "size": final_path.stat().st_size,
+        "sha256": digest.hexdigest() if digest is not None else None,
+    }
+    print(f"Verified {final_path.name}: {result['size']} bytes, sha256={result['sha256'] or 'n/a'}")
+    return result
+
+
+def find_incomplete_downloads(directory):
+    """Chrome leaves `.crdownload` files behind when a download never finished."""
+    directory = Path(directory)
+    if not directory.is_dir():
+        return []
+    return sorted(directory.glob("*.crdownload"))
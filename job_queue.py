@@ -0,0 +1,224 @@
+# job_queue.py
+import os
+import socket
+import sqlite3
+import threading
+import time
+from contextlib import closing
+
+DEFAULT_LEASE_SECONDS = 15 * 60.0
+# Shorter leases make the heartbeat (every third of a lease) hammer the shared SQLite file.
+MIN_LEASE_SECONDS = 60.0
+DEFAULT_MAX_ATTEMPTS = 3
+IDLE_POLL_SECONDS = 10.0
+
+JOB_PENDING = "pending"
+JOB_LEASED = "leased"
+JOB_DONE = "done"
+JOB_FAILED = "failed"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT NOT NULL,
+    url TEXT NOT NULL,
+    series_url TEXT,
+    season_url TEXT,
+    state TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    result TEXT,
+    error TEXT,
+    updated_at REAL,
+    UNIQUE (kind, url)
+);
+CREATE INDEX IF NOT EXISTS jobs_state ON jobs (state, lease_expires);
+"""
+
+
+def default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class JobQueue:
+    """Job queue stored in a SQLite file that every node can reach (e.g. a shared volume).
+
+    Each call opens its own short-lived connection, so the queue can be used from
+    heartbeat threads. The default rollback journal is kept on purpose: WAL mode
+    does not work on network filesystems.
+    """
+
+    def __init__(self, path, max_attempts: int = DEFAULT_MAX_ATTEMPTS):
+        self.path = str(path)
+        self.max_attempts = max_attempts
+        with closing(self._connect()) as conn:
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, kind: str, url: str, series_url: str = None, season_url: str = None, state: str = JOB_PENDING, result: str = None) -> bool:
+        """Add a job unless one already exists for this url; returns True when it was new."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "INSERT OR IGNORE INTO jobs (kind, url, series_url, season_url, state, result, updated_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, url, series_url, season_url, state, result, time.time()),
+            )
+            return cursor.rowcount == 1
+
+    def lease(self, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS, kind: str = None):
+        """Atomically claim the oldest runnable job, including ones whose lease has expired."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Crashed workers that already used up the last attempt: give up on the job.
+                conn.execute(
+                    "UPDATE jobs SET state = ?, error = COALESCE(error, 'lease expired'), lease_owner = NULL, updated_at = ? "
+                    "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                    (JOB_FAILED, now, JOB_LEASED, now, self.max_attempts),
+                )
+                query = (
+                    "SELECT * FROM jobs WHERE attempts < ? AND "
+                    "(state = ? OR (state = ? AND lease_expires < ?))"
+                )
+                params = [self.max_attempts, JOB_PENDING, JOB_LEASED, now]
+                if kind:
+                    query += " AND kind = ?"
+                    params.append(kind)
+                row = conn.execute(query + " ORDER BY id LIMIT 1", params).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+                if row["state"] == JOB_LEASED:
+                    print(f"Reclaiming job {row['id']} from expired lease of {row['lease_owner']}")
+                conn.execute(
+                    "UPDATE jobs SET state = ?, lease_owner = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                    (JOB_LEASED, worker_id, now + lease_seconds, now, row["id"]),
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        job = dict(row)
+        job["attempts"] += 1
+        return job
+
+    def renew(self, job_id: int, worker_id: str, lease_seconds: float = DEFAULT_LEASE_SECONDS) -> bool:
+        """Extend a lease; False means the job was reassigned and the result should be dropped."""
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND lease_owner = ? AND state = ?",
+                (now + lease_seconds, now, job_id, worker_id, JOB_LEASED),
+            )
+            return cursor.rowcount == 1
+
+    def complete(self, job_id: int, worker_id: str, result: str = None) -> bool:
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = ?, result = ?, error = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND state = ?",
+                (JOB_DONE, result, time.time(), job_id, worker_id, JOB_LEASED),
+            )
+            return cursor.rowcount == 1
+
+    def fail(self, job_id: int, worker_id: str, error: str) -> bool:
+        """Release a job after a failure; it goes back to pending until attempts run out."""
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+                "error = ?, lease_owner = NULL, lease_expires = NULL, updated_at = ? "
+                "WHERE id = ? AND lease_owner = ? AND state = ?",
+                (self.max_attempts, JOB_FAILED, JOB_PENDING, error, time.time(), job_id, worker_id, JOB_LEASED),
+            )
+            return cursor.rowcount == 1
+
+    def counts(self) -> dict:
+        with closing(self._connect()) as conn:
+            rows = conn.execute("SELECT state, COUNT(*) AS total FROM jobs GROUP BY state").fetchall()
+        return {row["state"]: row["total"] for row in rows}
+
+    def has_open_jobs(self) -> bool:
+        counts = self.counts()
+        return bool(counts.get(JOB_PENDING) or counts.get(JOB_LEASED))
+
+
+def enqueue_series(queue: JobQueue, series_url: str, list_seasons, list_episodes) -> int:
+    """Coordinator side: expand a series into season and episode jobs; returns new episode jobs."""
+    added = 0
+    for season_url in list_seasons(series_url):
+        episode_count = 0
+        for episode_url in list_episodes(season_url):
+            episode_count += 1
+            if queue.enqueue("episode", episode_url, series_url=series_url, season_url=season_url):
+                added += 1
+        # Season jobs record the expansion only; workers never lease them.
+        queue.enqueue("season", season_url, series_url=series_url, state=JOB_DONE, result=str(episode_count))
+        print(f"Queued season {season_url}: {episode_count} episode(s)")
+    return added
+
+
+class LeaseHeartbeat:
+    """Background renewal so long browser runs keep their lease while the worker is alive."""
+
+    def __init__(self, queue: JobQueue, job_id: int, worker_id: str, lease_seconds: float):
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"lease-{job_id}", daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.renew(self.job_id, self.worker_id, self.lease_seconds):
+                    self.lost = True
+                    return
+            except sqlite3.Error as exc:
+                print(f"Lease renewal failed for job {self.job_id}: {exc}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._stop.set()
+        self._thread.join()
+
+
+def run_worker(queue: JobQueue, handle_job, worker_id: str = None, lease_seconds: float = DEFAULT_LEASE_SECONDS, exit_when_empty: bool = False):
+    """Lease episode jobs and report results until the queue drains (or forever)."""
+    worker_id = worker_id or default_worker_id()
+    print(f"Worker {worker_id} started on queue {queue.path}")
+    while True:
+        job = queue.lease(worker_id, lease_seconds, kind="episode")
+        if job is None:
+            if exit_when_empty and not queue.has_open_jobs():
+                print(f"Queue drained: {queue.counts()}")
+                return
+            time.sleep(IDLE_POLL_SECONDS)
+            continue
+        print(f"Leased job {job['id']} (attempt {job['attempts']}/{queue.max_attempts}): {job['url']}")
+        with LeaseHeartbeat(queue, job["id"], worker_id, lease_seconds) as heartbeat:
+            try:
+                result = handle_job(job)
+                error = None if result else "no download link resolved"
+            except Exception as exc:  # pylint: disable=broad-except
+                result, error = None, f"{type(exc).__name__}: {exc}"
+        if heartbeat.lost:
+            print(f"Lease on job {job['id']} was lost; result discarded.")
+        elif error:
+            if queue.fail(job["id"], worker_id, error):
+                print(f"Job {job['id']} failed: {error}")
+            else:
+                print(f"Lease on job {job['id']} was lost before reporting; failure discarded.")
+        elif queue.complete(job["id"], worker_id, result):
+            print(f"Job {job['id']} done: {result}")
+        else:
+            print(f"Lease on job {job['id']} was lost before reporting; result discarded.")
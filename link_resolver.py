@@ -0,0 +1,107 @@
+# link_resolver.py
+import queue
+import threading
+import time
+from urllib.parse import urlparse, parse_qs
+
+DEFAULT_LOOKAHEAD = 2
+# Used when a link carries no expiry of its own.
+DEFAULT_LINK_TTL = 20 * 60.0
+# A link must still be valid this long when handed out, so the transfer can start on it.
+MIN_REMAINING_SECONDS = 60.0
+
+# Query parameters signed download hosts commonly use for an absolute unix expiry.
+EXPIRY_PARAMS = ("expires", "expire", "exp", "e", "expiry", "validto")
+
+_END = object()
+
+
+def link_expiry(url: str, resolved_at: float, default_ttl: float = DEFAULT_LINK_TTL) -> float:
+    """Best guess at the unix time a resolved link stops working."""
+    params = {key.lower(): values[0] for key, values in parse_qs(urlparse(url).query).items() if values}
+    for name in EXPIRY_PARAMS:
+        value = params.get(name, "")
+        if value.isdigit():
+            stamp = int(value)
+            if stamp > 10 ** 12:  # milliseconds
+                stamp //= 1000
+            if stamp > resolved_at - 24 * 60 * 60:
+                return float(stamp)
+    amz_expires = params.get("x-amz-expires", "")
+    if amz_expires.isdigit():
+        return resolved_at + int(amz_expires)
+    return resolved_at + default_ttl
+
+
+class LookaheadResolver:
+    """Resolve items a fixed number of steps ahead of the consumer and refresh links that went stale.
+
+    Iterating yields `(item, final_url)` in input order. A background thread keeps at
+    most `window` resolved-but-unconsumed links; a slot frees when the consumer takes
+    the next item, i.e. when the download engine starts on it. Resolution is
+    serialized because each run drives its own browser on a fixed debugging port.
+    """
+
+    def __init__(self, items, resolve, window: int = DEFAULT_LOOKAHEAD, default_ttl: float = DEFAULT_LINK_TTL, min_remaining: float = MIN_REMAINING_SECONDS):
+        if window < 1:
+            raise ValueError("Lookahead window must be at least 1.")
+        self.items = items
+        self.resolve = resolve
+        self.window = window
+        self.default_ttl = default_ttl
+        self.min_remaining = min_remaining
+        self.stats = {"resolved": 0, "refreshed": 0, "failed": 0}
+        self._slots = threading.Semaphore(window)
+        self._ready = queue.Queue()
+        self._resolve_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _resolve(self, item):
+        with self._resolve_lock:
+            final_url = self.resolve(item)
+            resolved_at = time.time()
+        if not final_url:
+            self.stats["failed"] += 1
+            return None, None
+        return final_url, link_expiry(final_url, resolved_at, self.default_ttl)
+
+    def _run(self):
+        try:
+            for item in self.items:
+                self._slots.acquire()
+                if self._stop.is_set():
+                    return
+                final_url, expires_at = self._resolve(item)
+                if final_url:
+                    self.stats["resolved"] += 1
+                self._ready.put((item, final_url, expires_at))
+        except Exception as exc:  # pylint: disable=broad-except
+            self._ready.put(exc)
+        finally:
+            self._ready.put(_END)
+
+    def __iter__(self):
+        self._thread = threading.Thread(target=self._run, name="link-lookahead", daemon=True)
+        self._thread.start()
+        try:
+            while True:
+                entry = self._ready.get()
+                if entry is _END:
+                    return
+                if isinstance(entry, Exception):
+                    raise entry
+                self._slots.release()
+                item, final_url, expires_at = entry
+                if final_url and expires_at - time.time() < self.min_remaining:
+                    print(f"Resolved link for {item} expired before use; resolving again...")
+                    self.stats["refreshed"] += 1
+                    final_url, expires_at = self._resolve(item)
+                yield item, final_url
+        finally:
+            self.close()
+
+    def close(self):
+        self._stop.set()
+        # Unblock the producer if it is waiting for a slot.
+        self._slots.release()
@@ -0,0 +1,66 @@
+# listing_cache.py
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(os.getcwd()) / ".listing_cache.json"
+
+
+class ListingCache:
+    """Validators, body hashes and extracted links of listing pages, persisted as JSON."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = Path(path)
+        self._entries = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        if self._entries is not None:
+            return self._entries
+        try:
+            with self.path.open("r", encoding="utf-8") as fp:
+                self._entries = json.load(fp)
+        except FileNotFoundError:
+            self._entries = {}
+        except (OSError, json.JSONDecodeError) as exc:
+            print(f"Ignoring unreadable listing cache {self.path}: {exc}")
+            self._entries = {}
+        return self._entries
+
+    def get(self, url: str):
+        with self._lock:
+            return self._load().get(url)
+
+    def conditional_headers(self, url: str) -> dict:
+        entry = self.get(url)
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, url: str, response_headers, body_hash: str, links, not_modified: bool = False) -> None:
+        with self._lock:
+            entries = self._load()
+            # A 304 may omit validators that still apply; a 200 replaces them outright.
+            previous = entries.get(url, {}) if not_modified else {}
+            entries[url] = {
+                "etag": response_headers.get("ETag") or previous.get("etag"),
+                "last_modified": response_headers.get("Last-Modified") or previous.get("last_modified"),
+                "body_hash": body_hash,
+                "links": list(links),
+                "checked_at": time.time(),
+            }
+            self._save(entries)
+
+    def _save(self, entries) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as fp:
+                json.dump(entries, fp, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            print(f"Unable to write listing cache {self.path}: {exc}")
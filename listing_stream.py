@@ -0,0 +1,153 @@
+# listing_stream.py
+import codecs
+import hashlib
+import queue
+import threading
+from html.parser import HTMLParser
+
+# Elements that never get a closing tag and must not be pushed on the open-element stack.
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+STREAM_CHUNK_SIZE = 16 * 1024
+
+_END_OF_STREAM = object()
+
+
+def season_link_matcher(stack) -> bool:
+    """Matches the `li.movieItem a` selector."""
+    return any(tag == "li" and "movieItem" in classes for tag, classes in stack)
+
+
+def episode_link_matcher(stack) -> bool:
+    """Matches the `.EpsList li a` selector."""
+    inside_list = False
+    for tag, classes in stack:
+        if "EpsList" in classes:
+            inside_list = True
+        elif inside_list and tag == "li":
+            return True
+    return False
+
+
+class LinkStreamParser(HTMLParser):
+    """Incremental parser that collects hrefs of anchors matching a selector."""
+
+    def __init__(self, matcher, path_marker: str):
+        super().__init__(convert_charrefs=True)
+        self.matcher = matcher
+        self.path_marker = path_marker
+        self.stack = []
+        self.pending = []
+        self.seen = set()
+
+    def handle_starttag(self, tag, attrs):
+        attributes = dict(attrs)
+        if tag == "a":
+            href = attributes.get("href")
+            if href and self.path_marker in href and href not in self.seen and self.matcher(self.stack):
+                self.seen.add(href)
+                self.pending.append(href)
+        if tag not in VOID_ELEMENTS:
+            classes = set((attributes.get("class") or "").split())
+            self.stack.append((tag, classes))
+
+    def handle_startendtag(self, tag, attrs):
+        if tag == "a":
+            self.handle_starttag(tag, attrs)
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        # Pop back to the matching open element; stray end tags are ignored.
+        for index in range(len(self.stack) - 1, -1, -1):
+            if self.stack[index][0] == tag:
+                del self.stack[index:]
+                return
+
+    def drain(self):
+        links, self.pending = self.pending, []
+        return links
+
+
+def iter_links_from_chunks(chunks, matcher, path_marker: str, encoding: str = None):
+    """Yield matching hrefs, in document order and de-duplicated, as soon as each chunk is parsed."""
+    decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+    parser = LinkStreamParser(matcher, path_marker)
+    for chunk in chunks:
+        if not chunk:
+            continue
+        parser.feed(decoder.decode(chunk))
+        yield from parser.drain()
+    parser.feed(decoder.decode(b"", final=True))
+    parser.close()
+    yield from parser.drain()
+
+
+def fetch_links(session, url: str, matcher, path_marker: str, cache=None):
+    """Yield matching hrefs from `url`, revalidating against `cache` when one is given.
+
+    A 304, or a 200 whose body hashes to the stored value, replays the cached
+    links without parsing. Without a cached entry the page is parsed as it streams.
+    """
+    entry = cache.get(url) if cache is not None else None
+    headers = cache.conditional_headers(url) if entry else {}
+    with session.get(url, headers=headers, stream=True) as response:
+        if entry and response.status_code == 304:
+            print(f"Listing unchanged (304): {url}")
+            cache.store(url, response.headers, entry["body_hash"], entry["links"], not_modified=True)
+            yield from entry["links"]
+            return
+
+        body_hash = hashlib.sha256()
+        def _hashed_chunks():
+            for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+                body_hash.update(chunk)
+                yield chunk
+
+        if entry:
+            # Revalidating without a 304: hash first, parse only if the body changed.
+            body = b"".join(_hashed_chunks())
+            if body_hash.hexdigest() == entry["body_hash"]:
+                print(f"Listing unchanged (same hash): {url}")
+                cache.store(url, response.headers, entry["body_hash"], entry["links"])
+                yield from entry["links"]
+                return
+            chunks = [body]
+        else:
+            chunks = _hashed_chunks()
+
+        links = []
+        for link in iter_links_from_chunks(chunks, matcher, path_marker, response.encoding):
+            links.append(link)
+            yield link
+        if cache is not None and response.status_code == 200:
+            cache.store(url, response.headers, body_hash.hexdigest(), links)
+
+
+def stream_links(session, url: str, matcher, path_marker: str, cache=None):
+    """Yield matching hrefs from `url` while the page is still downloading.
+
+    The body is read and parsed on a background thread, so a slow consumer (one
+    browser run per episode) never stalls the socket until the server drops it.
+    """
+    links = queue.Queue()
+
+    def _reader():
+        try:
+            for link in fetch_links(session, url, matcher, path_marker, cache):
+                links.put(link)
+        except Exception as exc:  # pylint: disable=broad-except
+            links.put(exc)
+        finally:
+            links.put(_END_OF_STREAM)
+
+    threading.Thread(target=_reader, name="listing-stream", daemon=True).start()
+    while True:
+        item = links.get()
+        if item is _END_OF_STREAM:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield item
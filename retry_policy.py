@@ -0,0 +1,159 @@
+# retry_policy.py
+import random
+import time
+from urllib.parse import urlparse
+
+from selenium.common.exceptions import (
+    TimeoutException,
+    StaleElementReferenceException,
+    NoSuchElementException,
+    NoSuchWindowException,
+    InvalidSessionIdException,
+    WebDriverException,
+)
+
+FAILURE_NETWORK = "network"
+FAILURE_TIMEOUT = "timeout"
+FAILURE_ELEMENT_MISSING = "element_missing"
+FAILURE_DRIVER_CRASH = "driver_crash"
+FAILURE_ANTI_BOT = "anti_bot"
+FAILURE_UNKNOWN = "unknown"
+
+# Base delay (seconds) before the first retry of each failure kind.
+BACKOFF_BASE_SECONDS = {
+    FAILURE_NETWORK: 2.0,
+    FAILURE_TIMEOUT: 1.0,
+    FAILURE_ELEMENT_MISSING: 0.5,
+    FAILURE_DRIVER_CRASH: 1.0,
+    FAILURE_ANTI_BOT: 15.0,
+    FAILURE_UNKNOWN: 1.0,
+}
+BACKOFF_MAX_SECONDS = 120.0
+
+# Failures after which the current browser must not be reused.
+DRIVER_FATAL_FAILURES = {FAILURE_DRIVER_CRASH, FAILURE_ANTI_BOT}
+
+DRIVER_CRASH_MARKERS = [
+    "chrome not reachable",
+    "invalid session id",
+    "session deleted",
+    "disconnected",
+    "target window already closed",
+    "no such window",
+    "tab crashed",
+    "failed to establish a new connection",
+    "connection refused",
+]
+
+NETWORK_ERROR_MARKERS = [
+    "net::err_",
+    "err_connection",
+    "err_name_not_resolved",
+    "err_internet_disconnected",
+    "err_timed_out",
+    "connection reset",
+    "name or service not known",
+]
+
+ANTI_BOT_MARKERS = [
+    "just a moment",
+    "attention required",
+    "checking your browser",
+    "cf-challenge",
+    "cf_chl_",
+    "g-recaptcha",
+    "h-captcha",
+    "verify you are human",
+    "ddos-guard",
+]
+
+
+def host_of(url: str) -> str:
+    return urlparse(url).netloc.lower() if url else ""
+
+
+def page_looks_like_anti_bot(driver) -> bool:
+    """Return True when the current page is a bot challenge instead of site content."""
+    if driver is None:
+        return False
+    try:
+        title = (driver.title or "").lower()
+        source = (driver.page_source or "")[:20000].lower()
+    except Exception:  # pylint: disable=broad-except
+        return False
+    return any(marker in title or marker in source for marker in ANTI_BOT_MARKERS)
+
+
+def driver_is_healthy(driver) -> bool:
+    """Cheap liveness probe: the session answers and still has a window."""
+    if driver is None:
+        return False
+    try:
+        handles = driver.window_handles
+        if not handles:
+            return False
+        if driver.current_window_handle not in handles:
+            driver.switch_to.window(handles[-1])
+        driver.execute_script("return 1")
+        return True
+    except Exception:  # pylint: disable=broad-except
+        return False
+
+
+def classify_failure(exc: BaseException, driver=None) -> str:
+    """Map an exception raised during automation to one of the FAILURE_* kinds."""
+    message = str(exc).lower()
+    if isinstance(exc, (InvalidSessionIdException, NoSuchWindowException)):
+        return FAILURE_DRIVER_CRASH
+    if isinstance(exc, WebDriverException) and any(marker in message for marker in NETWORK_ERROR_MARKERS):
+        return FAILURE_NETWORK
+    if any(marker in message for marker in DRIVER_CRASH_MARKERS):
+        return FAILURE_DRIVER_CRASH
+    if isinstance(exc, (ConnectionError, OSError)) and not isinstance(exc, TimeoutError):
+        return FAILURE_NETWORK
+    if page_looks_like_anti_bot(driver):
+        return FAILURE_ANTI_BOT
+    if isinstance(exc, (NoSuchElementException, StaleElementReferenceException)):
+        return FAILURE_ELEMENT_MISSING
+    if isinstance(exc, (TimeoutException, TimeoutError)):
+        return FAILURE_TIMEOUT
+    if isinstance(exc, WebDriverException):
+        return FAILURE_DRIVER_CRASH if not driver_is_healthy(driver) else FAILURE_UNKNOWN
+    return FAILURE_UNKNOWN
+
+
+class RetryPolicy:
+    """Per-host jittered exponential backoff shared by every automation run."""
+
+    def __init__(self, max_retries: int = 3, max_delay: float = BACKOFF_MAX_SECONDS, sleep=time.sleep):
+        self.max_retries = max_retries
+        self.max_delay = max_delay
+        self._sleep = sleep
+        self._host_failures = {}
+
+    def should_retry(self, attempt: int) -> bool:
+        return attempt < self.max_retries
+
+    def should_reuse_driver(self, failure_kind: str, driver) -> bool:
+        if failure_kind in DRIVER_FATAL_FAILURES:
+            return False
+        return driver_is_healthy(driver)
+
+    def record_failure(self, host: str, failure_kind: str) -> float:
+        """Register a failure against a host and return the jittered delay to wait."""
+        failures = self._host_failures.get(host, 0)
+        self._host_failures[host] = failures + 1
+        base = BACKOFF_BASE_SECONDS.get(failure_kind, BACKOFF_BASE_SECONDS[FAILURE_UNKNOWN])
+        ceiling = min(self.max_delay, base * (2 ** failures))
+        # "Equal jitter": keep half the window, randomise the rest so parallel runs spread out.
+        return ceiling / 2 + random.uniform(0, ceiling / 2)
+
+    def record_success(self, host: str) -> None:
+        self._host_failures.pop(host, None)
+
+    def backoff(self, host: str, failure_kind: str) -> float:
+        delay = self.record_failure(host, failure_kind)
+        if delay > 0:
+            print(f"Backing off {delay:.1f}s before retrying {host or 'request'} ({failure_kind})...")
+            self._sleep(delay)
+        return delay
@@ -1,18 +1,32 @@
+import argparse
 import sys
 import re
+from itertools import islice
 from pathlib import Path
+from urllib.parse import urlparse
 import requests
-from bs4 import BeautifulSoup
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, ElementClickInterceptedException, StaleElementReferenceException
 
-# Import from browser_utils
-from browser_utils import setup_driver, remove_overlays
+# BeautifulSoup, selenium, browser_utils and تحميل_متعدد are imported inside the
+# stages that use them, so listing-only and cache-hit runs never load a browser stack.
+from listing_stream import stream_links, season_link_matcher, episode_link_matcher
+from listing_cache import ListingCache
+from download_verify import DownloadError, download_and_verify, find_incomplete_downloads
+from browser_watchdog import DEFAULT_MAX_AGE_SECONDS, DEFAULT_MAX_RSS_MB, DEFAULT_WATCHDOG
+from link_resolver import DEFAULT_LINK_TTL, DEFAULT_LOOKAHEAD, MIN_REMAINING_SECONDS, LookaheadResolver
+from job_queue import DEFAULT_LEASE_SECONDS, MIN_LEASE_SECONDS, JobQueue, enqueue_series, run_worker
+from watch_mode import (
+    WATCH_STATE_FILENAME,
+    DEFAULT_POLL_INTERVAL,
+    MIN_POLL_INTERVAL,
+    MAX_POLL_INTERVAL,
+    POLL_INTERVAL_FLOOR,
+    WatchState,
+    AdaptiveInterval,
+    watch_series,
+)
 
-# Import from the second file (assuming it's in the same directory)
-from تحميل_متعدد import run_automation
+# Validators and links of series/season pages, revalidated on every run
+listing_cache = ListingCache()
 
 def debug(message):
     print(message, file=sys.stderr)
@@ -27,26 +41,29 @@ def ensure_download_directory(folder_name):
     path.mkdir(parents=True, exist_ok=True)
     return path
 
+def iter_season_links(series_url, session=None):
+    # Streams `li.movieItem a` hrefs in page order, without duplicates
+    session = session or requests.Session()
+    yield from stream_links(session, series_url, season_link_matcher, '/season/', cache=listing_cache)
+
+def iter_episode_links(season_url, session=None):
+    # Streams `.EpsList li a` hrefs while the season page is still downloading
+    session = session or requests.Session()
+    yield from stream_links(session, season_url, episode_link_matcher, '/episode/', cache=listing_cache)
+
 def extract_season_links(series_url):
-    session = requests.Session()
-    response = session.get(series_url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    items = soup.select('li.movieItem a')
-    season_links = [a['href'] for a in items if '/season/' in a['href']]
-    season_links = list(set(season_links))  # remove duplicates
+    season_links = list(iter_season_links(series_url))
     debug(f"Found {len(season_links)} season links")
     return season_links
 
 def extract_episode_links(season_url):
-    session = requests.Session()
-    response = session.get(season_url)
-    soup = BeautifulSoup(response.text, 'html.parser')
-    items = soup.select('.EpsList li a')
-    episode_links = [a['href'] for a in items if '/episode/' in a['href']]
+    episode_links = list(iter_episode_links(season_url))
     debug(f"Found {len(episode_links)} episode links for {season_url}")
     return episode_links
 
 def get_episode_page_with_servers(episode_url):
+    from bs4 import BeautifulSoup
+
     session = requests.Session()
     response = session.get(episode_url)
     response.raise_for_status()
@@ -76,6 +93,12 @@ def extract_server_link(episode_url, wanted_servers):
     return link, selected_server
 
 def selenium_get_final_download(server_link_url, selected_server):
+    from selenium.webdriver.common.by import By
+    from selenium.webdriver.support.ui import WebDriverWait
+    from selenium.webdriver.support import expected_conditions as EC
+    from selenium.common.exceptions import TimeoutException
+    from browser_utils import setup_driver
+
     print(f"Handling server link: {server_link_url} with server {selected_server}")
     driver = setup_driver(browser="chrome")  # Use the imported setup_driver
     driver.get(server_link_url)
@@ -107,7 +130,7 @@ def selenium_get_final_download(server_link_url, selected_server):
             print(f"Final URL: {final_url}")
         except TimeoutException:
             print("Could not find submit button")
-    driver.quit()
+    DEFAULT_WATCHDOG.retire(driver)
     return final_url
 
 def choose_from_list(items, title):
@@ -121,58 +144,316 @@ def choose_from_list(items, title):
         selected = [int(x.strip()) - 1 for x in choice.split(',') if x.strip().isdigit()]  # 0-based
         return selected
 
-if __name__ == "__main__":
-    series_url = input("Enter SERIES_URL: ").strip()
+def resolve_episode(episode_url, wanted_servers, keep_browser=True):
+    server_link, selected_server = extract_server_link(episode_url, wanted_servers)
+    if not server_link:
+        print("No suitable server found")
+        return None
+    print(f"Selected server {selected_server}, link {server_link}")
+    if selected_server == 'تحميل متعدد':
+        # Import from the second file (assuming it's in the same directory)
+        from تحميل_متعدد import run_automation
+
+        # Extract base_url and video_id from server_link
+        parsed = urlparse(server_link)
+        base_url = f"{parsed.scheme}://{parsed.netloc}"
+        video_id = parsed.path.strip('/')
+        quality_label = "Full HD"  # Can be made configurable
+        allow_prompt = False
+        browser = "chrome"
+        real_final_url = run_automation(video_id, quality_label, allow_prompt, browser, base_url, start_from_download=False, keep_browser=keep_browser)
+        if not real_final_url:
+            print("Failed to get the final link from multi download")
+            return None
+        print(f"Real download link: {real_final_url}")
+        return real_final_url
+    final_url = selenium_get_final_download(server_link, selected_server)
+    if not final_url:
+        print("Could not obtain final download link")
+        return None
+    print(f"Final direct download link: {final_url}")
+    print(f"Real download link: {final_url}")
+    return final_url
+
+def series_download_dir(series_url):
     match = re.search(r'/([^/]+)$', series_url)
     folder_name = match.group(1) if match else 'downloads'
-    folder_name = sanitize_folder_name(folder_name)
-    ensure_download_directory(folder_name)
+    return ensure_download_directory(sanitize_folder_name(folder_name))
+
+def process_episode(episode_url, wanted_servers, download_dir=None):
+    # When we download ourselves the browser is not needed past resolution
+    final_url = resolve_episode(episode_url, wanted_servers, keep_browser=download_dir is None)
+    if not final_url or download_dir is None:
+        return final_url
+    return download_episode(episode_url, final_url, download_dir)
+
+def download_episode(episode_url, final_url, download_dir):
+    # Named after the episode: hosts often serve every file as the same name
+    episode_name = sanitize_folder_name(urlparse(episode_url).path.rstrip('/').rsplit('/', 1)[-1])
+    try:
+        download_and_verify(requests.Session(), final_url, download_dir, episode_name, stem=episode_name)
+    except (DownloadError, requests.RequestException, OSError) as exc:
+        print(f"Download failed for {episode_url}: {exc}")
+        return None
+    return final_url
+
+def report_incomplete_browser_downloads():
+    # setup_driver points Chrome at BROWSER_DOWNLOAD_DIR; leftovers there never finished
+    from browser_utils import BROWSER_DOWNLOAD_DIR
+
+    leftovers = find_incomplete_downloads(BROWSER_DOWNLOAD_DIR)
+    for path in leftovers:
+        print(f"Incomplete browser download: {path}")
+    return leftovers
+
+def list_series(series_url, wanted_servers):
+    # Dry run: seasons, episodes and server links over plain HTTP, no browser
+    season_count = 0
+    for season_count, season_url in enumerate(iter_season_links(series_url), start=1):
+        print(f"Season {season_count}: {season_url}")
+        ep_num = 0
+        for ep_num, episode_url in enumerate(iter_episode_links(season_url), start=1):
+            print(f"  Episode {ep_num}: {episode_url}")
+            server_link, selected_server = extract_server_link(episode_url, wanted_servers)
+            print(f"    Server link: {server_link or 'none'} ({selected_server or 'no wanted server'})")
+        if not ep_num:
+            print("  No episodes")
+    if not season_count:
+        print("No seasons found")
+    return season_count
+
+def positive_int(value):
+    number = int(value)
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, got {value}")
+    return number
+
+def positive_float(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+    return number
+
+def link_ttl_seconds(value):
+    seconds = float(value)
+    if seconds <= MIN_REMAINING_SECONDS:
+        # Shorter lifetimes would count every link as stale on arrival and resolve it twice
+        raise argparse.ArgumentTypeError(f"must be more than {MIN_REMAINING_SECONDS:.0f} seconds, got {value}")
+    return seconds
+
+def lease_seconds(value):
+    seconds = float(value)
+    if seconds < MIN_LEASE_SECONDS:
+        raise argparse.ArgumentTypeError(f"must be at least {MIN_LEASE_SECONDS:.0f} seconds, got {value}")
+    return seconds
+
+def poll_seconds(value):
+    seconds = float(value)
+    if seconds < POLL_INTERVAL_FLOOR:
+        raise argparse.ArgumentTypeError(f"must be at least {POLL_INTERVAL_FLOOR:.0f} seconds, got {value}")
+    return seconds
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Batch download every episode of a series.")
+    parser.add_argument("--series-url", help="Series page URL. Prompted for when omitted.", dest="series_url")
+    parser.add_argument(
+        "--list-only",
+        "--dry-run",
+        help="Print seasons, episodes and server links without starting a browser.",
+        dest="list_only",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--download",
+        help="Download each resolved link into the series folder and verify it instead of leaving it to the browser.",
+        dest="download",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--lookahead",
+        help=f"With --download, how many episodes to resolve ahead of the one downloading. Defaults to {DEFAULT_LOOKAHEAD}.",
+        dest="lookahead",
+        type=positive_int,
+        default=DEFAULT_LOOKAHEAD,
+    )
+    parser.add_argument(
+        "--link-ttl",
+        help=f"Assumed lifetime in seconds of resolved links that carry no expiry. Defaults to {DEFAULT_LINK_TTL:.0f}.",
+        dest="link_ttl",
+        type=link_ttl_seconds,
+        default=DEFAULT_LINK_TTL,
+    )
+    parser.add_argument(
+        "--coordinator",
+        help="Expand the series into season and episode jobs on the shared queue and exit.",
+        dest="coordinator",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--worker",
+        help="Lease episode jobs from the shared queue and resolve them.",
+        dest="worker",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--queue-db",
+        help="SQLite file backing the shared job queue (put it on a volume every node mounts). Defaults to jobs.sqlite3.",
+        dest="queue_db",
+        default="jobs.sqlite3",
+    )
+    parser.add_argument(
+        "--lease-seconds",
+        help=f"How long a worker holds a job before it is reassigned if not renewed. Defaults to {DEFAULT_LEASE_SECONDS:.0f}.",
+        dest="lease_seconds",
+        type=lease_seconds,
+        default=DEFAULT_LEASE_SECONDS,
+    )
+    parser.add_argument("--worker-id", help="Name reported for leases. Defaults to host-pid.", dest="worker_id")
+    parser.add_argument(
+        "--exit-when-empty",
+        help="Stop the worker once no pending or leased jobs remain.",
+        dest="exit_when_empty",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--max-browser-mb",
+        help=f"Replace a browser once its process tree uses more memory than this. Defaults to {DEFAULT_MAX_RSS_MB:.0f}.",
+        dest="max_browser_mb",
+        type=positive_float,
+        default=DEFAULT_MAX_RSS_MB,
+    )
+    parser.add_argument(
+        "--max-browser-age",
+        help=f"Replace a browser once it has been running this many seconds. Defaults to {DEFAULT_MAX_AGE_SECONDS:.0f}.",
+        dest="max_browser_age",
+        type=positive_float,
+        default=DEFAULT_MAX_AGE_SECONDS,
+    )
+    parser.add_argument(
+        "--watch",
+        help="Keep polling the series and download only episodes not downloaded before.",
+        dest="watch",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--interval",
+        help=f"Initial polling interval in seconds for --watch. Defaults to {DEFAULT_POLL_INTERVAL}.",
+        dest="interval",
+        type=poll_seconds,
+        default=DEFAULT_POLL_INTERVAL,
+    )
+    parser.add_argument(
+        "--min-interval",
+        help=f"Shortest polling interval in seconds for --watch. Defaults to {MIN_POLL_INTERVAL}.",
+        dest="min_interval",
+        type=poll_seconds,
+        default=MIN_POLL_INTERVAL,
+    )
+    parser.add_argument(
+        "--max-interval",
+        help=f"Longest polling interval in seconds for --watch. Defaults to {MAX_POLL_INTERVAL}.",
+        dest="max_interval",
+        type=poll_seconds,
+        default=MAX_POLL_INTERVAL,
+    )
+    parser.add_argument(
+        "--once",
+        help="With --watch, run a single sync pass and exit (for cron/nightly jobs).",
+        dest="once",
+        action="store_true",
+    )
+    parser.add_argument(
+        "--mark-existing",
+        help="With --watch, record the episodes currently listed as downloaded without fetching them.",
+        dest="mark_existing",
+        action="store_true",
+    )
+    args = parser.parse_args()
+    if args.min_interval > args.max_interval:
+        parser.error(f"--min-interval ({args.min_interval:.0f}) cannot exceed --max-interval ({args.max_interval:.0f})")
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    wanted_servers = ["تحميل متعدد"]
+    DEFAULT_WATCHDOG.max_rss_mb = args.max_browser_mb
+    DEFAULT_WATCHDOG.max_age_seconds = args.max_browser_age
+    if not args.list_only and not args.coordinator:
+        DEFAULT_WATCHDOG.reap_orphans()
+    if args.worker:
+        run_worker(
+            JobQueue(args.queue_db),
+            lambda job: process_episode(
+                job["url"],
+                wanted_servers,
+                series_download_dir(job["series_url"]) if args.download else None,
+            ),
+            worker_id=args.worker_id,
+            lease_seconds=args.lease_seconds,
+            exit_when_empty=args.exit_when_empty,
+        )
+        sys.exit(0)
+    series_url = args.series_url or input("Enter SERIES_URL: ").strip()
+    if args.list_only:
+        sys.exit(0 if list_series(series_url, wanted_servers) else 1)
+    if args.coordinator:
+        job_queue = JobQueue(args.queue_db)
+        added = enqueue_series(job_queue, series_url, iter_season_links, iter_episode_links)
+        print(f"Queued {added} new episode job(s); queue state: {job_queue.counts()}")
+        sys.exit(0)
+    # Only --download and --watch write into the series folder; without them Chrome saves to BROWSER_DOWNLOAD_DIR
+    download_dir = series_download_dir(series_url) if args.download or args.watch else None
+    target_dir = download_dir if args.download else None
+    if args.watch:
+        state = WatchState(download_dir / WATCH_STATE_FILENAME)
+        schedule = AdaptiveInterval(args.interval, args.min_interval, args.max_interval)
+        watch_series(
+            series_url,
+            state,
+            iter_season_links,
+            iter_episode_links,
+            lambda episode_url: process_episode(episode_url, wanted_servers, target_dir),
+            schedule,
+            once=args.once or args.mark_existing,
+            mark_only=args.mark_existing,
+        )
+        report_incomplete_browser_downloads()
+        sys.exit(0)
     season_links = extract_season_links(series_url)
     if not season_links:
         print("No seasons found")
         sys.exit(1)
     print(f"Found {len(season_links)} seasons")
     selected_seasons = choose_from_list(season_links, "Choose seasons:")
-    wanted_servers = ["تحميل متعدد"]
     for season_idx in selected_seasons:
         season_url = season_links[season_idx]
-        episode_links = extract_episode_links(season_url)
-        if not episode_links:
-            print(f"No episodes for this season: {season_url}")
-            continue
-        print(f"Season: {season_url}, Episodes: {len(episode_links)}")
+        print(f"Season: {season_url}")
+        num_ep = None
         if len(selected_seasons) == 1:
             num_ep_str = input("Number of episodes to download (enter for all): ").strip()
             if num_ep_str:
                 num_ep = int(num_ep_str)
-                episode_links = episode_links[:num_ep]
-        for ep_num, episode_url in enumerate(episode_links, start=1):
-            print(f"Processing episode {ep_num}/{len(episode_links)}: {episode_url}")
-            server_link, selected_server = extract_server_link(episode_url, wanted_servers)
-            if not server_link:
-                print("No suitable server found")
-                continue
-            print(f"Selected server {selected_server}, link {server_link}")
-            if selected_server == 'تحميل متعدد':
-                # Extract base_url and video_id from server_link
-                from urllib.parse import urlparse
-                parsed = urlparse(server_link)
-                base_url = f"{parsed.scheme}://{parsed.netloc}"
-                video_id = parsed.path.strip('/')
-                quality_label = "Full HD"  # Can be made configurable
-                allow_prompt = False
-                browser = "chrome"
-                real_final_url = run_automation(video_id, quality_label, allow_prompt, browser, base_url, start_from_download=False)
-                if real_final_url:
-                    ep_real_download_link = real_final_url
-                    print(f"Real download link: {ep_real_download_link}")
-                else:
-                    print("Failed to get the final link from multi download")
-            else:
-                final_url = selenium_get_final_download(server_link, selected_server)
-                if not final_url:
-                    print("Could not obtain final download link")
-                    continue
-                print(f"Final direct download link: {final_url}")
-                ep_real_download_link = final_url
-                print(f"Real download link: {ep_real_download_link}")
\ No newline at end of file
+        # Episodes are processed as they are parsed, before the season page finishes downloading
+        episode_links = islice(iter_episode_links(season_url), num_ep)
+        ep_num = 0
+        if target_dir is not None:
+            # Resolve just ahead of the downloader so signed links are still fresh when used
+            resolver = LookaheadResolver(
+                episode_links,
+                # The browser is retired as soon as the link is out, so the window bounds live browsers too
+                lambda episode_url: resolve_episode(episode_url, wanted_servers, keep_browser=False),
+                window=args.lookahead,
+                default_ttl=args.link_ttl,
+            )
+            for ep_num, (episode_url, final_url) in enumerate(resolver, start=1):
+                print(f"Downloading episode {ep_num}: {episode_url}")
+                if final_url:
+                    download_episode(episode_url, final_url, target_dir)
+            print(f"Link resolution: {resolver.stats}")
+        else:
+            for ep_num, episode_url in enumerate(episode_links, start=1):
+                print(f"Processing episode {ep_num}: {episode_url}")
+                process_episode(episode_url, wanted_servers, target_dir)
+        if not ep_num:
+            print(f"No episodes for this season: {season_url}")
+    report_incomplete_browser_downloads()
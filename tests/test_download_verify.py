@@ -0,0 +1,117 @@
+import hashlib
+
+import pytest
+
+from download_verify import DownloadError, download_and_verify
+
+
+def mp4_box(box_type, payload):
+    return (8 + len(payload)).to_bytes(4, "big") + box_type + payload
+
+
+SOURCE = (
+    mp4_box(b"ftyp", b"isom0000")
+    + mp4_box(b"moov", b"m" * 100)
+    + mp4_box(b"mdat", bytes(range(1, 256)) * 41000)
+)
+
+
+class FakeResponse:
+    def __init__(self, body, status_code, headers):
+        self.body = body
+        self.status_code = status_code
+        self.headers = headers
+        self.url = "http://host/files/episode.mp4"
+
+    def raise_for_status(self):
+        pass
+
+    def iter_content(self, chunk_size):
+        for index in range(0, len(self.body), chunk_size):
+            yield self.body[index:index + chunk_size]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+class FakeSession:
+    """Serves `first_body` for the initial GET and `source` for range requests."""
+
+    def __init__(self, first_body, source=SOURCE):
+        self.first_body = first_body
+        self.source = source
+        self.range_requests = 0
+
+    def get(self, url, headers=None, stream=True, timeout=None):
+        if headers and "Range" in headers:
+            self.range_requests += 1
+            start, _, end = headers["Range"].split("=")[1].partition("-")
+            end = int(end) + 1 if end else len(self.source)
+            content_range = f"bytes {start}-{end - 1}/{len(self.source)}"
+            return FakeResponse(self.source[int(start):end], 206, {"Content-Range": content_range})
+        headers = {"Content-Length": str(len(self.source)), "Content-Type": "video/mp4"}
+        return FakeResponse(self.first_body, 200, headers)
+
+
+def test_zero_filled_trailer_is_refetched_from_last_written_byte(tmp_path):
+    # Zeros start mid-block, so a block-aligned walk back would leave some of them in mdat.
+    cut = len(SOURCE) - 3 * 1024 * 1024 - 5000
+    preallocated = SOURCE[:cut] + b"\x00" * (len(SOURCE) - cut)
+
+    result = download_and_verify(FakeSession(preallocated), "http://host/files/episode.mp4", tmp_path)
+
+    assert result["path"].read_bytes() == SOURCE
+
+
+def test_oversized_file_is_truncated_to_announced_size(tmp_path):
+    result = download_and_verify(FakeSession(SOURCE + b"junk" * 10), "http://host/files/episode.mp4", tmp_path)
+
+    assert result["path"].read_bytes() == SOURCE
+    assert result["sha256"] is None
+
+
+def test_truncated_transfer_keeps_streaming_hash(tmp_path):
+    result = download_and_verify(FakeSession(SOURCE[:300000]), "http://host/files/episode.mp4", tmp_path)
+
+    assert result["path"].read_bytes() == SOURCE
+    assert result["sha256"] == hashlib.sha256(SOURCE).hexdigest()
+
+
+def test_fragmented_mp4_with_unlisted_boxes_is_accepted(tmp_path):
+    fragmented = (
+        mp4_box(b"ftyp", b"iso60000")
+        + mp4_box(b"moov", b"m" * 100)
+        + mp4_box(b"prft", b"p" * 20)
+        + mp4_box(b"emsg", b"e" * 30)
+        + mp4_box(b"moof", b"f" * 50)
+        + mp4_box(b"mdat", b"d" * 4000)
+    )
+    session = FakeSession(fragmented, fragmented)
+
+    result = download_and_verify(session, "http://host/files/episode.mp4", tmp_path)
+
+    assert result["path"].read_bytes() == fragmented
+    assert session.range_requests == 0
+
+
+def test_repair_stops_when_refetch_returns_the_same_damage(tmp_path):
+    # A box claiming a size smaller than its own header, served identically on every request.
+    broken = mp4_box(b"ftyp", b"isom0000") + (4).to_bytes(4, "big") + b"moov" + b"m" * 100
+    session = FakeSession(broken, broken)
+
+    with pytest.raises(DownloadError, match="corrupt box 'moov'"):
+        download_and_verify(session, "http://host/files/episode.mp4", tmp_path)
+
+    assert session.range_requests == 1
+
+
+def test_stem_keeps_episodes_served_under_one_name_apart(tmp_path):
+    first = download_and_verify(FakeSession(SOURCE), "http://host/files/video.mp4", tmp_path, stem="episode-1")
+    second = download_and_verify(FakeSession(SOURCE), "http://host/files/video.mp4", tmp_path, stem="episode-2")
+
+    assert first["path"].name == "episode-1.mp4"
+    assert second["path"].name == "episode-2.mp4"
+    assert first["path"].exists()
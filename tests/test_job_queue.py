@@ -0,0 +1,95 @@
+import sqlite3
+
+from job_queue import JOB_DONE, JOB_FAILED, JOB_LEASED, JOB_PENDING, JobQueue, enqueue_series, run_worker
+
+
+def job_row(queue, job_id):
+    with sqlite3.connect(queue.path) as conn:
+        conn.row_factory = sqlite3.Row
+        return dict(conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone())
+
+
+def expire_lease(queue, job_id):
+    with sqlite3.connect(queue.path) as conn:
+        conn.execute("UPDATE jobs SET lease_expires = 0 WHERE id = ?", (job_id,))
+
+
+def test_enqueue_is_idempotent_and_seasons_are_never_leased(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite3")
+
+    def list_episodes(season_url):
+        return [f"{season_url}/ep1", f"{season_url}/ep2"]
+
+    assert enqueue_series(queue, "http://site/series", lambda url: ["http://site/s1"], list_episodes) == 2
+    assert enqueue_series(queue, "http://site/series", lambda url: ["http://site/s1"], list_episodes) == 0
+
+    leased = [queue.lease("w1", kind="episode"), queue.lease("w1", kind="episode")]
+    assert [job["url"] for job in leased] == ["http://site/s1/ep1", "http://site/s1/ep2"]
+    assert queue.lease("w1", kind="episode") is None
+    assert queue.counts() == {JOB_DONE: 1, JOB_LEASED: 2}
+
+
+def test_expired_lease_is_reclaimed_and_old_owner_cannot_report(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite3")
+    queue.enqueue("episode", "http://site/ep1")
+    job = queue.lease("w1", lease_seconds=60)
+    assert queue.lease("w2", lease_seconds=60) is None
+
+    expire_lease(queue, job["id"])
+    reclaimed = queue.lease("w2", lease_seconds=60)
+
+    assert reclaimed["id"] == job["id"]
+    assert reclaimed["attempts"] == 2
+    assert not queue.renew(job["id"], "w1")
+    assert not queue.complete(job["id"], "w1", "stale")
+    assert not queue.fail(job["id"], "w1", "stale")
+    assert queue.complete(job["id"], "w2", "http://cdn/ep1.mp4")
+    assert job_row(queue, job["id"])["result"] == "http://cdn/ep1.mp4"
+
+
+def test_failures_requeue_until_max_attempts(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite3", max_attempts=2)
+    queue.enqueue("episode", "http://site/ep1")
+
+    job = queue.lease("w1")
+    assert queue.fail(job["id"], "w1", "boom")
+    assert job_row(queue, job["id"])["state"] == JOB_PENDING
+
+    job = queue.lease("w1")
+    assert queue.fail(job["id"], "w1", "boom again")
+    row = job_row(queue, job["id"])
+    assert row["state"] == JOB_FAILED
+    assert row["error"] == "boom again"
+    assert queue.lease("w1") is None
+
+
+def test_expired_lease_on_last_attempt_is_marked_failed(tmp_path):
+    queue = JobQueue(tmp_path / "jobs.sqlite3", max_attempts=1)
+    queue.enqueue("episode", "http://site/ep1")
+    job = queue.lease("w1")
+
+    expire_lease(queue, job["id"])
+
+    assert queue.lease("w2") is None
+    row = job_row(queue, job["id"])
+    assert row["state"] == JOB_FAILED
+    assert row["error"] == "lease expired"
+    assert not queue.has_open_jobs()
+
+
+def test_worker_discards_result_when_lease_was_taken_over(tmp_path, capsys):
+    queue = JobQueue(tmp_path / "jobs.sqlite3")
+    queue.enqueue("episode", "http://site/ep1")
+
+    def handle_job(job):
+        # Another worker reclaimed and finished the job while this one was still resolving it.
+        expire_lease(queue, job["id"])
+        queue.complete(queue.lease("w2")["id"], "w2", "from w2")
+        return "from w1"
+
+    run_worker(queue, handle_job, worker_id="w1", lease_seconds=60, exit_when_empty=True)
+
+    assert "result discarded" in capsys.readouterr().out
+    row = job_row(queue, 1)
+    assert row["state"] == JOB_DONE
+    assert row["result"] == "from w2"
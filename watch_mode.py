@@ -0,0 +1,144 @@
+# watch_mode.py
+import json
+import os
+import time
+from pathlib import Path
+
+WATCH_STATE_FILENAME = ".watch_state.json"
+
+DEFAULT_POLL_INTERVAL = 30 * 60.0
+MIN_POLL_INTERVAL = 5 * 60.0
+MAX_POLL_INTERVAL = 24 * 60 * 60.0
+# No interval may go below this, whatever the command line says: polling faster only hammers the site.
+POLL_INTERVAL_FLOOR = 60.0
+
+# How the interval reacts to a poll: shrink when episodes keep landing, grow while the series is quiet.
+SPEEDUP_FACTOR = 0.5
+SLOWDOWN_FACTOR = 1.5
+
+# Episodes that fail to resolve are retried with their own backoff, then given up on.
+EPISODE_RETRY_BASE_SECONDS = 30 * 60.0
+EPISODE_RETRY_MAX_SECONDS = 24 * 60 * 60.0
+MAX_EPISODE_ATTEMPTS = 5
+
+
+class WatchState:
+    """Per-season record of episode URLs that were already downloaded."""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            with self.path.open("r", encoding="utf-8") as fp:
+                self.data = json.load(fp)
+        except FileNotFoundError:
+            self.data = {}
+        except (OSError, json.JSONDecodeError) as exc:
+            print(f"Ignoring unreadable watch state {self.path}: {exc}")
+            self.data = {}
+        self.data.setdefault("seasons", {})
+        self.data.setdefault("failures", {})
+
+    def downloaded(self, season_url: str) -> dict:
+        return self.data["seasons"].get(season_url, {})
+
+    def new_episodes(self, season_url: str, episode_links):
+        known = self.downloaded(season_url)
+        return [url for url in episode_links if url not in known]
+
+    def is_first_seen(self, episode_url: str) -> bool:
+        return episode_url not in self.data["failures"]
+
+    def due_for_attempt(self, episode_url: str) -> bool:
+        failure = self.data["failures"].get(episode_url)
+        if failure is None:
+            return True
+        return failure["attempts"] < MAX_EPISODE_ATTEMPTS and time.time() >= failure["retry_after"]
+
+    def mark_downloaded(self, season_url: str, episode_url: str, final_url: str = None) -> None:
+        season = self.data["seasons"].setdefault(season_url, {})
+        season[episode_url] = {"final_url": final_url, "downloaded_at": time.time()}
+        self.data["failures"].pop(episode_url, None)
+        self.save()
+
+    def mark_failed(self, episode_url: str) -> None:
+        failure = self.data["failures"].setdefault(episode_url, {"attempts": 0})
+        failure["attempts"] += 1
+        delay = min(EPISODE_RETRY_BASE_SECONDS * 2 ** (failure["attempts"] - 1), EPISODE_RETRY_MAX_SECONDS)
+        failure["retry_after"] = time.time() + delay
+        if failure["attempts"] >= MAX_EPISODE_ATTEMPTS:
+            print(f"Giving up on {episode_url} after {failure['attempts']} failed attempts.")
+        else:
+            print(f"Will retry {episode_url} in {delay / 60:.0f} minutes.")
+        self.save()
+
+    def save(self) -> None:
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        try:
+            with tmp_path.open("w", encoding="utf-8") as fp:
+                json.dump(self.data, fp, indent=2, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except OSError as exc:
+            print(f"Unable to write watch state {self.path}: {exc}")
+
+
+class AdaptiveInterval:
+    """Polling interval that tracks how often new episodes show up."""
+
+    def __init__(self, initial: float = DEFAULT_POLL_INTERVAL, minimum: float = MIN_POLL_INTERVAL, maximum: float = MAX_POLL_INTERVAL):
+        if minimum > maximum:
+            raise ValueError("Minimum polling interval cannot exceed the maximum.")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.current = min(max(initial, minimum), maximum)
+
+    def update(self, found_new: bool) -> float:
+        factor = SPEEDUP_FACTOR if found_new else SLOWDOWN_FACTOR
+        self.current = min(max(self.current * factor, self.minimum), self.maximum)
+        return self.current
+
+
+def sync_series(series_url: str, state: WatchState, list_seasons, list_episodes, resolve, mark_only: bool = False) -> int:
+    """Run one poll: diff every season's episode list against `state` and handle only new entries.
+
+    Returns the number of episodes seen for the first time, which is what drives the
+    polling speed-up. Episodes whose resolution fails are retried on later polls
+    with their own backoff until MAX_EPISODE_ATTEMPTS is reached.
+    """
+    new_count = 0
+    for season_url in list_seasons(series_url):
+        pending = state.new_episodes(season_url, list_episodes(season_url))
+        first_seen = [url for url in pending if state.is_first_seen(url)]
+        new_count += len(first_seen)
+        due = pending if mark_only else [url for url in pending if state.due_for_attempt(url)]
+        if not due:
+            continue
+        print(f"Season {season_url}: {len(first_seen)} new episode(s), {len(due) - len(first_seen)} retry(ies)")
+        for episode_url in due:
+            if mark_only:
+                state.mark_downloaded(season_url, episode_url)
+                continue
+            print(f"Processing episode: {episode_url}")
+            final_url = resolve(episode_url)
+            if final_url:
+                state.mark_downloaded(season_url, episode_url, final_url)
+            else:
+                state.mark_failed(episode_url)
+    return new_count
+
+
+def watch_series(series_url: str, state: WatchState, list_seasons, list_episodes, resolve, schedule: AdaptiveInterval, once: bool = False, mark_only: bool = False):
+    while True:
+        try:
+            new_count = sync_series(series_url, state, list_seasons, list_episodes, resolve, mark_only)
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"Poll failed: {exc}")
+            new_count = 0
+        if mark_only:
+            print(f"Recorded {new_count} existing episode(s) as downloaded.")
+        else:
+            print(f"Poll finished: {new_count} new episode(s).")
+        if once:
+            return
+        delay = schedule.update(new_count > 0)
+        print(f"Next poll in {delay / 60:.1f} minutes.")
+        time.sleep(delay)
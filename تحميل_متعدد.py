@@ -15,7 +15,10 @@ from selenium.common.exceptions import (
 )
 
 # Import from browser_utils
-from browser_utils import setup_driver, remove_overlays
+from browser_utils import BROWSER_DOWNLOAD_DIR, setup_driver, remove_overlays
+from browser_watchdog import DEFAULT_WATCHDOG, BrowserBudgetExceeded
+from download_verify import find_incomplete_downloads
+from retry_policy import FAILURE_DRIVER_CRASH, RetryPolicy, classify_failure, host_of
 
 QUALITY_PRESETS = {
     "4k": "4K quality",
@@ -51,6 +54,14 @@ FINAL_DOWNLOAD_BUTTON_TARGETS = [
     },
 ]
 
+# Checkpoints run_automation can resume from, in pipeline order.
+STEP_VIDEO_PAGE = "video page"
+STEP_DOWNLOAD_PAGE = "download page"
+STEP_QUALITY_PAGE = "quality page"
+STEP_F1 = "F1"
+
+DEFAULT_RETRY_POLICY = RetryPolicy(max_retries=3)
+
 def wait_for_page_ready(driver, timeout: int = 20):
     try:
         WebDriverWait(driver, timeout).until(
@@ -250,95 +261,158 @@ def click_post_download_link(driver):
     driver.switch_to.default_content()
     print(f"Post-download link URL: {driver.current_url}")
     return True
-def run_automation(video_id: str, quality_label: str, allow_prompt: bool, browser: str, base_url: str, start_from_download: bool = False, download_page_url: str = None):
+def quit_driver(driver):
+    # Kills whatever survives quit(), including when quit() itself throws
+    DEFAULT_WATCHDOG.retire(driver)
+def browser_transfers_finished() -> bool:
+    return not find_incomplete_downloads(BROWSER_DOWNLOAD_DIR)
+def resume_at(driver, url: str, force_reload: bool = False):
+    """Navigate to a checkpoint URL unless the live driver is already there.
+
+    force_reload is for retries on a reused driver: the page it is on is the one that just failed."""
+    if not force_reload:
+        try:
+            if driver.current_url.startswith(url):
+                return
+        except Exception:
+            pass
+    print(f"Resuming at: {url}")
+    driver.get(url)
+    wait_for_page_ready(driver, timeout=20)
+    remove_overlays(driver)
+def open_video_page(driver, video_url: str, download_page_url: str):
+    print(f"Opening video page: {video_url}")
+    driver.get(video_url)
+    wait_for_page_ready(driver, timeout=20)
+    remove_overlays(driver)
+    try:
+        download_link = WebDriverWait(driver, 20).until(
+            EC.element_to_be_clickable((
+                By.XPATH,
+                "//a[contains(@href, '/f/') and contains(translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'download')]",
+            ))
+        )
+    except TimeoutException:
+        raise NoSuchElementException("Could not find the Download button on the video page.")
+    driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", download_link)
+    remove_overlays(driver)
+    print("Clicking the Download button...")
+    opened = click_element(driver, download_link, expect_new_window=True)
+    if opened:
+        wait_for_page_ready(driver, timeout=10)
+    else:
+        wait_for_page_ready(driver, timeout=5)
+    if not wait_for_url_prefix(driver, download_page_url, timeout=5):
+        print("Falling back to direct download page navigation...")
+        driver.get(download_page_url)
+        wait_for_page_ready(driver, timeout=20)
+def open_quality_page(driver, video_id: str, quality_label: str, allow_prompt: bool):
+    print(f"On download selection page: {driver.current_url}")
+    remove_overlays(driver)
+    quality_options = collect_quality_options(driver, video_id)
+    selected_option = select_quality_option(quality_options, quality_label, allow_prompt)
+    print(f"Clicking the '{selected_option['label']}' quality link...")
+    quality_opened = click_element(driver, selected_option["element"], expect_new_window=True)
+    if quality_opened:
+        wait_for_page_ready(driver, timeout=10)
+    else:
+        wait_for_page_ready(driver, timeout=5)
+    if not wait_for_url_prefix(driver, selected_option["href"], timeout=5):
+        print("Navigating directly to the selected quality URL...")
+        driver.get(selected_option["href"])
+        wait_for_page_ready(driver, timeout=20)
+    remove_overlays(driver)
+    return selected_option
+def run_automation(video_id: str, quality_label: str, allow_prompt: bool, browser: str, base_url: str, start_from_download: bool = False, download_page_url: str = None, retry_policy: RetryPolicy = None, keep_browser: bool = True):
+    """Resolve the final download link; with keep_browser the browser stays open (under the
+    watchdog) to finish the transfer it started, otherwise it is retired right away."""
+    policy = retry_policy or DEFAULT_RETRY_POLICY
+    host = host_of(base_url)
     driver = None
-    max_retries = 3
     attempt = 0
-   
-    while attempt < max_retries:
+    video_url = f"{base_url}/{video_id}"
+    if not download_page_url:
+        download_page_url = f"{base_url}/f/{video_id}"
+    # Last completed step and the URL the next step starts from.
+    checkpoint = {"step": None, "url": video_url}
+    if start_from_download:
+        checkpoint = {"step": STEP_VIDEO_PAGE, "url": download_page_url}
+
+    # Set when a failed attempt is retried on the same browser, whose DOM is the broken one.
+    reload_checkpoint = False
+    # Checkpoints at which the browser was already replaced for being over budget.
+    replaced_at = set()
+
+    while True:
         attempt += 1
-        print(f"\n=== Attempt {attempt}/{max_retries} ===")
-       
+        print(f"\n=== Attempt {attempt}/{policy.max_retries} (resuming after: {checkpoint['step'] or 'start'}) ===")
+
         try:
             if driver is None:
                 driver = setup_driver(browser=browser)
-           
-            video_url = f"{base_url}/{video_id}"
-            if not download_page_url:
-                download_page_url = f"{base_url}/f/{video_id}"
-            if start_from_download:
-                print(f"Opening download page directly: {download_page_url}")
-                driver.get(download_page_url)
-                wait_for_page_ready(driver, timeout=20)
-                remove_overlays(driver)
-            else:
-                print(f"Opening video page: {video_url}")
-                driver.get(video_url)
-                wait_for_page_ready(driver, timeout=20)
-                remove_overlays(driver)
-                try:
-                    download_link = WebDriverWait(driver, 20).until(
-                        EC.element_to_be_clickable((
-                            By.XPATH,
-                            "//a[contains(@href, '/f/') and contains(translate(normalize-space(.), 'ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz'), 'download')]",
-                        ))
-                    )
-                except TimeoutException:
-                    raise RuntimeError("Could not find the Download button on the video page.")
-                driver.execute_script("arguments[0].scrollIntoView({block: 'center'});", download_link)
-                remove_overlays(driver)
-                print("Clicking the Download button...")
-                opened = click_element(driver, download_link, expect_new_window=True)
-                if opened:
-                    wait_for_page_ready(driver, timeout=10)
-                else:
-                    wait_for_page_ready(driver, timeout=5)
-                if not wait_for_url_prefix(driver, download_page_url, timeout=5):
-                    print("Falling back to direct download page navigation...")
-                    driver.get(download_page_url)
-                    wait_for_page_ready(driver, timeout=20)
-            print(f"On download selection page: {driver.current_url}")
-            remove_overlays(driver)
-            quality_options = collect_quality_options(driver, video_id)
-            selected_option = select_quality_option(quality_options, quality_label, allow_prompt)
-            print(f"Clicking the '{selected_option['label']}' quality link...")
-            quality_opened = click_element(driver, selected_option["element"], expect_new_window=True)
-            if quality_opened:
-                wait_for_page_ready(driver, timeout=10)
+
+            if checkpoint["step"] is None:
+                open_video_page(driver, video_url, download_page_url)
+                checkpoint = {"step": STEP_VIDEO_PAGE, "url": download_page_url}
+                DEFAULT_WATCHDOG.check(driver)
             else:
-                wait_for_page_ready(driver, timeout=5)
-            if not wait_for_url_prefix(driver, selected_option["href"], timeout=5):
-                print("Navigating directly to the selected quality URL...")
-                driver.get(selected_option["href"])
-                wait_for_page_ready(driver, timeout=20)
-            remove_overlays(driver)
-            click_final_download_button(driver)
-            if click_post_download_link(driver):
-                print("\n✓ Download completed successfully!")
-                return driver.current_url
+                resume_at(driver, checkpoint["url"], force_reload=reload_checkpoint)
+            reload_checkpoint = False
+
+            if checkpoint["step"] == STEP_VIDEO_PAGE:
+                selected_option = open_quality_page(driver, video_id, quality_label, allow_prompt)
+                # Pin the chosen quality so retries do not prompt again.
+                quality_label, allow_prompt = selected_option["label"], False
+                checkpoint = {"step": STEP_DOWNLOAD_PAGE, "url": selected_option["href"]}
+                DEFAULT_WATCHDOG.check(driver)
+
+            if checkpoint["step"] == STEP_DOWNLOAD_PAGE:
+                click_final_download_button(driver)
+                checkpoint = {"step": STEP_QUALITY_PAGE, "url": driver.current_url}
+                DEFAULT_WATCHDOG.check(driver)
+
+            if not click_post_download_link(driver):
+                raise NoSuchElementException("Post-download link not found after the F1 button.")
+            checkpoint = {"step": STEP_F1, "url": driver.current_url}
+            policy.record_success(host)
+            print("\n✓ Download completed successfully!")
+            final_url = driver.current_url
+            if keep_browser:
+                # Chrome carries on with the transfer; the watchdog retires it when done or over budget.
+                DEFAULT_WATCHDOG.hold(driver, browser_transfers_finished)
             else:
-                return None
+                quit_driver(driver)
+            return final_url
         except Exception as e:
-            print(f"Error on attempt {attempt}: {str(e)}")
-            if attempt < max_retries:
-                print("Retrying...")
-                # Restart driver
-                if driver:
-                    try:
-                        driver.quit()
-                    except Exception:
-                        pass
+            over_budget = isinstance(e, BrowserBudgetExceeded)
+            if over_budget and checkpoint["step"] not in replaced_at:
+                # Not a failure: swap in a fresh browser and resume without using up an attempt.
+                print(f"Replacing browser: {e}")
+                quit_driver(driver)
                 driver = None
-            else:
-                print(f"Failed after {max_retries} attempts.")
+                replaced_at.add(checkpoint["step"])
+                attempt -= 1
+                continue
+            # A replacement that is over budget again at the same step counts as a failed attempt.
+            failure_kind = FAILURE_DRIVER_CRASH if over_budget else classify_failure(e, driver)
+            print(f"Error on attempt {attempt} ({failure_kind}): {str(e)}")
+            if not policy.should_retry(attempt):
+                print(f"Failed after {policy.max_retries} attempts.")
+                quit_driver(driver)
                 return None
-       
-    if driver:
-        try:
-            driver.quit()
-        except Exception:
-            pass
-    return None
+            if policy.should_reuse_driver(failure_kind, driver):
+                print("Reusing the current browser session.")
+                reload_checkpoint = True
+            else:
+                print("Restarting the browser...")
+                quit_driver(driver)
+                driver = None
+            policy.backoff(host, failure_kind)
+def positive_float(value):
+    number = float(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"must be greater than 0, got {value}")
+    return number
 def parse_args():
     parser = argparse.ArgumentParser(description="Automate video downloads via Selenium.")
     parser.add_argument("--video-id", help="Video identifier from the URL", dest="video_id")
@@ -378,9 +452,26 @@ def parse_args():
         dest="download_page_url",
         default=None,
     )
+    parser.add_argument(
+        "--max-browser-mb",
+        help=f"Replace the browser once its process tree uses more memory than this. Defaults to {DEFAULT_WATCHDOG.max_rss_mb:.0f}.",
+        dest="max_browser_mb",
+        type=positive_float,
+        default=DEFAULT_WATCHDOG.max_rss_mb,
+    )
+    parser.add_argument(
+        "--max-browser-age",
+        help=f"Replace the browser once it has been running this many seconds. Defaults to {DEFAULT_WATCHDOG.max_age_seconds:.0f}.",
+        dest="max_browser_age",
+        type=positive_float,
+        default=DEFAULT_WATCHDOG.max_age_seconds,
+    )
     return parser.parse_args()
 def main():
     args = parse_args()
+    DEFAULT_WATCHDOG.max_rss_mb = args.max_browser_mb
+    DEFAULT_WATCHDOG.max_age_seconds = args.max_browser_age
+    DEFAULT_WATCHDOG.reap_orphans()
     base_url = args.base_url
     if not base_url:
         if args.no_prompt: